@@ -19,6 +19,13 @@ class Settings(BaseSettings):
     # Database Configuration (SQLite for local/tests, PostgreSQL via env var for Docker)
     database_url: str = "sqlite:///currency_demo.db"
 
+    # Connection pool sizing (PostgreSQL only)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    # Disable client-side pooling when an external pooler (e.g. PgBouncer) is in front
+    db_use_null_pool: bool = False
+
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -63,6 +70,15 @@ class Settings(BaseSettings):
             raise ValueError(msg)
         return v
 
+    @field_validator("db_pool_size", "db_max_overflow", "db_pool_timeout")
+    @classmethod
+    def validate_pool_setting(cls, v: int) -> int:
+        """Validate connection pool settings are not negative."""
+        if v < 0:
+            msg = "Connection pool settings cannot be negative"
+            raise ValueError(msg)
+        return v
+
     @field_validator("jwt_secret_key")
     @classmethod
     def validate_jwt_secret_key(cls, v: str) -> str:
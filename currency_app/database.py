@@ -1,13 +1,22 @@
 """Database configuration and session management."""
 
-import time
+import re
 from contextlib import contextmanager
+from functools import lru_cache
+from time import perf_counter
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import TimeoutError as SQLTimeoutError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from currency_app.config import settings
+from currency_app.middleware.metrics import (
+    record_database_connection_error,
+    record_database_connection_timeout,
+    record_database_query_duration,
+    update_connection_pool_metrics,
+)
 from currency_app.models.database import Base
 
 # Database configuration
@@ -21,89 +30,93 @@ if DATABASE_URL.startswith("sqlite://"):
         connect_args={"check_same_thread": False},  # Needed for SQLite
         echo=False,  # Set to True for SQL debugging
     )
+elif settings.db_use_null_pool:
+    # PostgreSQL behind a transaction-mode pooler (e.g. PgBouncer): open a connection
+    # per checkout and close it on return, leaving multiplexing to the pooler
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=NullPool,
+        echo=False,  # Set to True for SQL debugging
+    )
 else:
     # PostgreSQL configuration for Docker/production
     engine = create_engine(
         DATABASE_URL,
-        pool_size=3,  # Connection pool size
-        max_overflow=0,  # Additional connections
+        pool_size=settings.db_pool_size,  # Connection pool size
+        max_overflow=settings.db_max_overflow,  # Additional connections
         pool_recycle=3600,  # Recycle connections after 1 hour
-        pool_timeout=5,  # Timeout after 5 seconds waiting for connection
+        pool_timeout=settings.db_pool_timeout,  # Seconds to wait for a free connection
+        pool_pre_ping=True,  # Detect stale connections before handing them out
         echo=False,  # Set to True for SQL debugging
     )
 
 # Create session maker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Table name following the keyword that identifies the target of a statement
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
 
-def create_tables():
-    """Create all database tables."""
-    Base.metadata.create_all(bind=engine)
 
+@lru_cache(maxsize=512)
+def _classify_statement(statement: str) -> tuple[str, str]:
+    """Extract the operation and table from a SQL statement for metric labels."""
+    words = statement.split(None, 1)
+    operation = words[0].lower() if words else ""
+    match = _TABLE_RE.search(statement)
+    table = match.group(1).lower() if match else ""
+    return operation, table
 
-def get_db():
-    """Dependency to get database session."""
-    start_time = time.time()
-    db = None
 
-    try:
-        db = SessionLocal()
-        # Update connection pool metrics
-        from currency_app.middleware.metrics import update_connection_pool_metrics
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """Record when a statement is sent to the database."""
+    context.query_start_time = perf_counter()
 
-        update_connection_pool_metrics(engine)
 
-        yield db
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """Record how long a statement took to execute."""
+    duration = perf_counter() - context.query_start_time
+    operation, table = _classify_statement(statement)
+    record_database_query_duration(operation, table, duration)
 
-    except SQLTimeoutError:
-        # Record connection timeout
-        from currency_app.middleware.metrics import record_database_connection_timeout
 
-        record_database_connection_timeout()
-        raise
-    except Exception as e:
-        # Record connection error
-        from currency_app.middleware.metrics import record_database_connection_error
+# Pool gauges are sampled at most once per interval rather than on every session
+_POOL_SAMPLE_INTERVAL = 1.0
+_last_pool_sample = float("-inf")
 
-        error_type = type(e).__name__
-        record_database_connection_error(error_type)
-        raise
-    finally:
-        if db:
-            db.close()
 
-        # Record session duration
-        duration = time.time() - start_time
-        from currency_app.middleware.metrics import record_database_query_duration
+def create_tables():
+    """Create all database tables."""
+    Base.metadata.create_all(bind=engine)
+
 
-        record_database_query_duration("session", "general", duration)
+def _sample_pool_metrics():
+    """Update connection pool metrics if the sampling interval has elapsed."""
+    global _last_pool_sample
+    now = perf_counter()
+    if now - _last_pool_sample >= _POOL_SAMPLE_INTERVAL:
+        _last_pool_sample = now
+        update_connection_pool_metrics(engine)
 
 
-@contextmanager
-def get_db_with_metrics():
-    """Context manager for database sessions with comprehensive metrics tracking."""
-    start_time = time.time()
+def get_db():
+    """Dependency to get database session."""
     db = None
 
     try:
         db = SessionLocal()
         # Update connection pool metrics
-        from currency_app.middleware.metrics import update_connection_pool_metrics
-
-        update_connection_pool_metrics(engine)
+        _sample_pool_metrics()
 
         yield db
 
     except SQLTimeoutError:
         # Record connection timeout
-        from currency_app.middleware.metrics import record_database_connection_timeout
-
         record_database_connection_timeout()
         raise
     except Exception as e:
         # Record connection error
-        from currency_app.middleware.metrics import record_database_connection_error
-
         error_type = type(e).__name__
         record_database_connection_error(error_type)
         raise
@@ -111,8 +124,6 @@ def get_db_with_metrics():
         if db:
             db.close()
 
-        # Record session duration
-        duration = time.time() - start_time
-        from currency_app.middleware.metrics import record_database_query_duration
 
-        record_database_query_duration("session", "general", duration)
+# Context manager form of get_db for use outside FastAPI dependency injection
+get_db_with_metrics = contextmanager(get_db)
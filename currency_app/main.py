@@ -3,12 +3,17 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from currency_app.database import create_tables
 from currency_app.logging_config import get_logger
 from currency_app.middleware.auth import AuthenticationMiddleware
 from currency_app.middleware.logging import LoggingMiddleware
-from currency_app.middleware.metrics import PrometheusMiddleware, get_metrics
+from currency_app.middleware.metrics import (
+    PrometheusMiddleware,
+    get_metrics,
+    prebind_route_metrics,
+)
 from currency_app.routers import conversion, debug, health, home, rates
 from currency_app.tracing_config import configure_tracing, instrument_application
 
@@ -98,7 +103,11 @@ async def metrics() -> Response:
     Returns:
         Prometheus metrics in text format
     """
-    return Response(content=get_metrics(), media_type="text/plain")
+    return Response(content=get_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+# Resolve per-route request metric children once all routes are registered
+prebind_route_metrics(app.routes)
 
 
 if __name__ == "__main__":
@@ -1,24 +1,38 @@
 """Prometheus metrics middleware for FastAPI."""
 
 import re
-import time
-from collections.abc import Callable
+from collections.abc import Iterable
+from time import perf_counter
+from typing import Any
 
-from fastapi import Request, Response
+from fastapi.routing import APIRoute
 from prometheus_client import Counter, Gauge, Histogram, generate_latest
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Single-pass pattern used to normalize UUIDs and numeric IDs in unmatched paths
+_NORMALIZE_RE = re.compile(
+    r"/(?P<u>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})|/(?P<n>\d+)"
+)
+
+
+def _normalize_repl(match: re.Match[str]) -> str:
+    """Choose the placeholder for a matched UUID or numeric ID segment."""
+    return "/{uuid}" if match.lastgroup == "u" else "/{id}"
+
 
 # Prometheus metrics
 REQUEST_COUNT = Counter(
     "http_requests_total", "Total number of HTTP requests", ["method", "endpoint", "status_code"]
 )
 
+# Buckets are kept coarse to limit series per label set; both histograms keep a
+# boundary at 1s and one above it so the >1000ms p95 alerts remain reachable
 REQUEST_DURATION = Histogram(
-    "http_request_duration_seconds", "HTTP request duration in seconds", ["method", "endpoint"]
-)
-
-IN_PROGRESS_REQUESTS = Gauge(
-    "http_requests_in_progress", "Number of HTTP requests currently being processed"
+    "http_request_duration_seconds",
+    "HTTP request duration in seconds",
+    ["method", "endpoint"],
+    buckets=[0.01, 0.1, 1.0, 2.5],
 )
 
 # Application-specific metrics
@@ -58,83 +72,141 @@ DATABASE_QUERY_DURATION = Histogram(
     "database_query_duration_seconds",
     "Database query duration in seconds",
     ["operation", "table"],
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    buckets=[0.005, 0.05, 0.5, 1.0, 5.0],
 )
 
 DATABASE_CONNECTION_ERRORS = Counter(
     "database_connection_errors_total", "Total number of database connection errors", ["error_type"]
 )
 
+# Paths excluded from HTTP metrics: the metrics endpoint itself plus high-frequency,
+# low-value probe and documentation endpoints
+_SKIP_PATHS = frozenset(
+    {
+        "/metrics",
+        "/health",
+        "/healthz",
+        "/ready",
+        "/favicon.ico",
+        "/openapi.json",
+        "/docs",
+        "/redoc",
+    }
+)
 
-class PrometheusMiddleware(BaseHTTPMiddleware):
-    """Middleware to collect Prometheus metrics for HTTP requests."""
+# Bounded label values for database query metrics; anything else is reported as "other"
+_ALLOWED_TABLES = frozenset({"conversion_history", "rate_history"})
+_ALLOWED_OPS = frozenset({"select", "insert", "update", "delete"})
+
+# Bounded label values for database connection errors; anything else is reported as "other"
+_KNOWN_ERRORS = frozenset(
+    {
+        "OperationalError",
+        "IntegrityError",
+        "ProgrammingError",
+        "DataError",
+        "InternalError",
+        "InvalidRequestError",
+        "DBAPIError",
+        "pool_metrics_error",
+    }
+)
 
-    def __init__(self, app):
-        """Initialize the middleware."""
-        super().__init__(app)
+# Labeled child metrics keyed by (metric, *label_values), resolved once per combination
+_label_cache: dict[tuple, Any] = {}
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request and collect metrics."""
-        # Skip metrics endpoint to avoid recursion
-        if request.url.path == "/metrics":
-            return await call_next(request)
 
-        # Extract route pattern for consistent labeling
-        endpoint = self._get_endpoint_pattern(request)
-        method = request.method
+def _labeled(metric: Any, *label_values: str) -> Any:
+    """Return the labeled child of a metric, resolving it only on first use."""
+    key = (metric, *label_values)
+    child = _label_cache.get(key)
+    if child is None:
+        child = _label_cache[key] = metric.labels(*label_values)
+    return child
 
-        # Track in-progress requests
-        IN_PROGRESS_REQUESTS.inc()
 
-        # Start timing
-        start_time = time.time()
+def clear_label_cache() -> None:
+    """Drop cached labeled children (required after calling ``clear()`` on a metric)."""
+    _label_cache.clear()
 
-        try:
-            # Process request
-            response = await call_next(request)
-            status_code = str(response.status_code)
 
-            # Record successful request
-            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
+def prebind_route_metrics(routes: Iterable[BaseRoute]) -> None:
+    """Resolve request metric children for every route at startup.
 
-            return response
+    Success and error counters plus the duration histogram are created for each
+    (method, path) pair of the application's API routes, so handling a request
+    only hits the label cache.
+    """
+    for route in routes:
+        if not isinstance(route, APIRoute) or route.path in _SKIP_PATHS:
+            continue
+        for method in route.methods:
+            _labeled(REQUEST_COUNT, method, route.path, "200")
+            _labeled(REQUEST_COUNT, method, route.path, "500")
+            _labeled(REQUEST_DURATION, method, route.path)
 
-        except Exception:
-            # Record failed request
-            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code="500").inc()
-            raise
 
-        finally:
-            # Record request duration
-            duration = time.time() - start_time
-            REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(duration)
+def _observe_request(method: str, endpoint: str, status_code: str, duration: float) -> None:
+    """Record the count and duration of a completed HTTP request."""
+    _labeled(REQUEST_COUNT, method, endpoint, status_code).inc()
+    _labeled(REQUEST_DURATION, method, endpoint).observe(duration)
 
-            # Decrement in-progress requests
-            IN_PROGRESS_REQUESTS.dec()
 
-    def _get_endpoint_pattern(self, request: Request) -> str:
-        """Extract endpoint pattern from request for consistent labeling."""
-        # Try to get the route pattern from FastAPI
-        if hasattr(request, "scope") and "route" in request.scope:
-            route = request.scope["route"]
-            if hasattr(route, "path"):
-                return route.path
+class PrometheusMiddleware:
+    """Pure ASGI middleware to collect Prometheus metrics for HTTP requests.
+
+    Implemented without BaseHTTPMiddleware to avoid its per-request task and
+    stream overhead; the response status is captured by wrapping ``send``.
+    """
 
-        # Fallback to actual path, but normalize IDs
-        path = request.url.path
+    def __init__(self, app: ASGIApp):
+        """Initialize the middleware."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Process request and collect metrics."""
+        # Skip non-HTTP traffic, the metrics endpoint (avoids recursion) and probe/docs endpoints
+        if scope["type"] != "http" or scope["path"] in _SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
 
-        # Replace common ID patterns with placeholders for better grouping
-        # Replace UUIDs
-        path = re.sub(
-            r"/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", "/{uuid}", path
-        )
-        # Replace numeric IDs
-        return re.sub(r"/\d+", "/{id}", path)
+        # Unhandled exceptions propagate without a response and are counted as 500
+        status_code = "500"
 
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+            await send(message)
 
-def get_metrics() -> str:
-    """Get current metrics in Prometheus format."""
-    return generate_latest().decode("utf-8")
+        start_time = perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+
+        finally:
+            duration = perf_counter() - start_time
+            # The router stores the matched route in the scope, so the endpoint label is
+            # resolved after the app has run; only unmatched paths need normalizing
+            endpoint = self._get_endpoint_pattern(scope)
+            _observe_request(method, endpoint, status_code, duration)
+
+    def _get_endpoint_pattern(self, scope: Scope) -> str:
+        """Extract endpoint pattern from the request scope for consistent labeling."""
+        # Try to get the route pattern from FastAPI
+        route_path = getattr(scope.get("route"), "path", None)
+        if route_path is not None:
+            return route_path
+
+        # Fallback to actual path, replacing UUIDs and numeric IDs with placeholders
+        return _NORMALIZE_RE.sub(_normalize_repl, scope["path"])
+
+
+def get_metrics() -> bytes:
+    """Get current metrics in Prometheus format as UTF-8 encoded bytes."""
+    return generate_latest()
 
 
 # Utility functions for application-specific metrics
@@ -159,8 +231,15 @@ def record_database_operation(operation: str, table: str, *, success: bool = Tru
 
 
 def record_database_query_duration(operation: str, table: str, duration: float):
-    """Record database query duration."""
-    DATABASE_QUERY_DURATION.labels(operation=operation, table=table).observe(duration)
+    """Record database query duration.
+
+    Unknown operations and tables are collapsed to "other" to keep label cardinality bounded.
+    """
+    if operation not in _ALLOWED_OPS:
+        operation = "other"
+    if table not in _ALLOWED_TABLES:
+        table = "other"
+    _labeled(DATABASE_QUERY_DURATION, operation, table).observe(duration)
 
 
 def record_database_connection_timeout():
@@ -169,8 +248,12 @@ def record_database_connection_timeout():
 
 
 def record_database_connection_error(error_type: str):
-    """Record database connection error."""
-    DATABASE_CONNECTION_ERRORS.labels(error_type=error_type).inc()
+    """Record database connection error.
+
+    Unknown error types are collapsed to "other" to keep label cardinality bounded.
+    """
+    label = error_type if error_type in _KNOWN_ERRORS else "other"
+    _labeled(DATABASE_CONNECTION_ERRORS, label).inc()
 
 
 def update_connection_pool_metrics(engine):
@@ -182,15 +265,13 @@ def update_connection_pool_metrics(engine):
         DATABASE_CONNECTION_POOL_SIZE.set(pool.size())
 
         # Set active connections (checked out)
-        DATABASE_CONNECTION_POOL_CHECKED_OUT.set(pool.checkedout())
-
-        # Calculate available connections
-        active_connections = pool.checkedout()
-        DATABASE_CONNECTION_POOL_ACTIVE.set(active_connections)
+        checked_out = pool.checkedout()
+        DATABASE_CONNECTION_POOL_CHECKED_OUT.set(checked_out)
+        DATABASE_CONNECTION_POOL_ACTIVE.set(checked_out)
 
     except AttributeError:
         # Handle case where pool doesn't support these methods (e.g., SQLite)
         pass
-    except Exception as e:
+    except Exception:
         # Log error but don't fail
-        record_database_connection_error(f"pool_metrics_error_{type(e).__name__}")
+        record_database_connection_error("pool_metrics_error")
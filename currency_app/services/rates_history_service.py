@@ -4,6 +4,7 @@ import random
 from datetime import UTC, datetime, timedelta
 from decimal import ROUND_HALF_EVEN, Decimal
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from currency_app.models.conversion import HistoricalRateInfo, RatesHistoryResponse
@@ -55,7 +56,7 @@ class RatesHistoryService:
             Number of historical records created
         """
         base_rates = self.currency_service.EXCHANGE_RATES
-        total_records = 0
+        rows = []
 
         # Generate data for each day going back
         for day_offset in range(days_back):
@@ -81,18 +82,21 @@ class RatesHistoryService:
                             Decimal("0.000001"), rounding=ROUND_HALF_EVEN
                         )
 
-                    rate_history = RateHistory(
-                        currency=currency,
-                        rate=varied_rate,
-                        base_currency="USD",
-                        recorded_at=timestamp,
-                        rate_source="simulated",
+                    rows.append(
+                        {
+                            "currency": currency,
+                            "rate": varied_rate,
+                            "base_currency": "USD",
+                            "recorded_at": timestamp,
+                            "rate_source": "simulated",
+                        }
                     )
-                    self.db_session.add(rate_history)
-                    total_records += 1
 
+        # Insert all snapshots in a single executemany round trip
+        if rows:
+            self.db_session.execute(insert(RateHistory), rows)
         self.db_session.commit()
-        return total_records
+        return len(rows)
 
     def get_rates_history(
         self, currency: str | None = None, days: int = 7, limit: int = 1000
@@ -1,10 +1,14 @@
 """Tests for database functionality."""
 
 import contextlib
+from unittest.mock import patch
 
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from currency_app.database import SessionLocal, get_db
+from currency_app import database
+from currency_app.database import SessionLocal, _classify_statement, get_db
+from currency_app.middleware.metrics import DATABASE_QUERY_DURATION, clear_label_cache
 
 
 class TestDatabaseSessionManagement:
@@ -44,6 +48,32 @@ class TestDatabaseSessionManagement:
         # We can verify this by checking that db.close() was called
         assert db is not None  # Session object still exists but was closed
 
+    def test_get_db_samples_pool_metrics_at_interval(self):
+        """Test that pool metrics are sampled at most once per interval."""
+        with (
+            patch.object(database, "_last_pool_sample", float("-inf")),
+            patch.object(database, "update_connection_pool_metrics") as mock_update,
+        ):
+            for _ in range(3):
+                with database.get_db_with_metrics():
+                    pass
+
+            mock_update.assert_called_once_with(database.engine)
+
+    def test_queries_record_duration_metric(self):
+        """Test that executed statements are timed via engine events."""
+        DATABASE_QUERY_DURATION.clear()
+        clear_label_cache()
+
+        with database.get_db_with_metrics() as db:
+            db.execute(text("SELECT 1"))
+
+        samples = next(iter(DATABASE_QUERY_DURATION.collect())).samples
+        count_samples = [s for s in samples if s.name.endswith("_count")]
+        assert len(count_samples) == 1
+        assert count_samples[0].labels == {"operation": "select", "table": "other"}
+        assert count_samples[0].value == 1.0
+
     def test_get_db_session_isolation(self):
         """Test that get_db creates separate session instances."""
         db_generator1 = get_db()
@@ -97,3 +127,26 @@ class TestDatabaseSessionManagement:
 
         finally:
             db.close()
+
+
+class TestClassifyStatement:
+    """Test SQL statement classification for query metrics."""
+
+    def test_select(self):
+        """Test that SELECT statements resolve to their FROM table."""
+        statement = "SELECT rate_history.id, rate_history.rate FROM rate_history WHERE 1 = 1"
+        assert _classify_statement(statement) == ("select", "rate_history")
+
+    def test_insert(self):
+        """Test that INSERT statements resolve to their INTO table."""
+        statement = "INSERT INTO conversion_history (id, amount) VALUES (?, ?)"
+        assert _classify_statement(statement) == ("insert", "conversion_history")
+
+    def test_update(self):
+        """Test that UPDATE statements resolve to the updated table."""
+        statement = 'UPDATE "rate_history" SET rate=? WHERE rate_history.id = ?'
+        assert _classify_statement(statement) == ("update", "rate_history")
+
+    def test_statement_without_table(self):
+        """Test that statements without a table yield an empty table name."""
+        assert _classify_statement("SELECT 1") == ("select", "")
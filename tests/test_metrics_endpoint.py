@@ -9,6 +9,7 @@ from currency_app.main import app
 from currency_app.middleware.metrics import (
     REQUEST_COUNT,
     REQUEST_DURATION,
+    clear_label_cache,
     get_metrics,
 )
 
@@ -26,13 +27,14 @@ class TestMetricsEndpoint:
         """Clear Prometheus metrics before each test."""
         REQUEST_COUNT.clear()
         REQUEST_DURATION.clear()
+        clear_label_cache()
 
     def test_metrics_endpoint_returns_prometheus_format(self, client):
         """Test that /metrics endpoint returns Prometheus format."""
         response = client.get("/metrics")
 
         assert response.status_code == 200
-        assert response.headers["content-type"] == "text/plain; charset=utf-8"
+        assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
 
         content = response.text
         # Should contain Prometheus metric format
@@ -47,7 +49,6 @@ class TestMetricsEndpoint:
         # Check for HTTP metrics
         assert "http_requests_total" in content
         assert "http_request_duration_seconds" in content
-        assert "http_requests_in_progress" in content
 
         # Check for application-specific metrics
         assert "currency_conversions_total" in content
@@ -89,9 +90,9 @@ class TestMetricsEndpoint:
         """Test the get_metrics utility function."""
         metrics_output = get_metrics()
 
-        assert isinstance(metrics_output, str)
-        assert "# HELP" in metrics_output
-        assert "# TYPE" in metrics_output
+        assert isinstance(metrics_output, bytes)
+        assert b"# HELP" in metrics_output
+        assert b"# TYPE" in metrics_output
 
     @patch("currency_app.middleware.metrics.generate_latest")
     def test_get_metrics_function_with_mock(self, mock_generate_latest):
@@ -100,7 +101,7 @@ class TestMetricsEndpoint:
 
         result = get_metrics()
 
-        assert result == "mocked_metrics_output"
+        assert result == b"mocked_metrics_output"
         mock_generate_latest.assert_called_once()
 
     def test_metrics_after_requests_show_counts(self, client):
@@ -125,13 +126,13 @@ class TestMetricsEndpoint:
         ]
         assert len(root_requests) >= 1
 
-        # Look for health endpoint requests
+        # Health checks are excluded from request metrics
         health_requests = [
             line
             for line in lines
             if "http_requests_total{" in line and 'endpoint="/health"' in line
         ]
-        assert len(health_requests) >= 1
+        assert len(health_requests) == 0
 
         # Look for conversion endpoint requests
         convert_requests = [
@@ -16,10 +16,10 @@ from currency_app.main import app
 from currency_app.middleware.metrics import (
     CURRENCY_CONVERSIONS_TOTAL,
     DATABASE_OPERATIONS_TOTAL,
-    IN_PROGRESS_REQUESTS,
     RATES_REQUESTS_TOTAL,
     REQUEST_COUNT,
     REQUEST_DURATION,
+    clear_label_cache,
 )
 from currency_app.models.database import Base
 
@@ -67,10 +67,10 @@ class TestMetricsIntegration:
         """Clear Prometheus metrics before each test."""
         REQUEST_COUNT.clear()
         REQUEST_DURATION.clear()
-        IN_PROGRESS_REQUESTS.set(0)
         CURRENCY_CONVERSIONS_TOTAL.clear()
         RATES_REQUESTS_TOTAL.clear()
         DATABASE_OPERATIONS_TOTAL.clear()
+        clear_label_cache()
 
     @pytest.fixture
     def auth_headers(self):
@@ -100,8 +100,8 @@ class TestMetricsIntegration:
         assert 'http_requests_total{endpoint="/",method="GET",status_code="200"} 1.0' in content
         assert 'http_request_duration_seconds_count{endpoint="/",method="GET"} 1.0' in content
 
-    def test_health_endpoint_generates_metrics(self, client):
-        """Test that health endpoint generates HTTP metrics."""
+    def test_health_endpoint_not_tracked(self, client):
+        """Test that health endpoint is excluded from HTTP metrics."""
         response = client.get("/health")
         assert response.status_code == 200
 
@@ -109,10 +109,8 @@ class TestMetricsIntegration:
         metrics_response = client.get("/metrics")
         content = metrics_response.text
 
-        # Should show request to health endpoint
-        assert (
-            'http_requests_total{endpoint="/health",method="GET",status_code="200"} 1.0' in content
-        )
+        # Should not show requests to health endpoint
+        assert 'endpoint="/health"' not in content
 
     def test_currency_conversion_generates_multiple_metrics(self, client, auth_headers):
         """Test that currency conversion generates both HTTP and application metrics."""
@@ -249,9 +247,7 @@ class TestMetricsIntegration:
 
         # Should show accumulated HTTP metrics
         assert 'http_requests_total{endpoint="/",method="GET",status_code="200"} 2.0' in content
-        assert (
-            'http_requests_total{endpoint="/health",method="GET",status_code="200"} 1.0' in content
-        )
+        assert 'endpoint="/health"' not in content
         assert (
             'http_requests_total{endpoint="/api/v1/convert",method="POST",status_code="200"} 2.0'
             in content
@@ -267,18 +263,6 @@ class TestMetricsIntegration:
             in content
         )
 
-    def test_in_progress_requests_gauge_resets(self, client):
-        """Test that in-progress requests gauge is properly managed."""
-        # Make a request
-        client.get("/")
-
-        # Check metrics - in-progress should be 0 after request completes
-        metrics_response = client.get("/metrics")
-        content = metrics_response.text
-
-        # Should show 0 in-progress requests
-        assert "http_requests_in_progress 0.0" in content
-
     def test_duration_histogram_buckets_present(self, client):
         """Test that duration histogram includes proper buckets."""
         # Make a request
@@ -365,10 +349,8 @@ class TestMetricsIntegration:
         metrics_response = client.get("/metrics")
         content = metrics_response.text
 
-        # Should show all HTTP requests
-        assert (
-            'http_requests_total{endpoint="/health",method="GET",status_code="200"} 1.0' in content
-        )
+        # Should show all HTTP requests except the health check
+        assert 'endpoint="/health"' not in content
         assert (
             'http_requests_total{endpoint="/api/v1/rates",method="GET",status_code="200"} 1.0'
             in content
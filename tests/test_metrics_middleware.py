@@ -3,16 +3,32 @@
 from unittest.mock import AsyncMock, Mock
 
 import pytest
-from fastapi import Request, Response
+from fastapi import FastAPI
 
 from currency_app.middleware.metrics import (
-    IN_PROGRESS_REQUESTS,
     REQUEST_COUNT,
     REQUEST_DURATION,
     PrometheusMiddleware,
+    clear_label_cache,
+    prebind_route_metrics,
 )
 
 
+def make_app(status: int = 200):
+    """Create a minimal ASGI app that responds with the given status."""
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return AsyncMock(side_effect=app)
+
+
+def make_scope(path: str = "/api/v1/convert", **extra):
+    """Create an HTTP request scope."""
+    return {"type": "http", "method": "GET", "path": path, **extra}
+
+
 class TestPrometheusMiddleware:
     """Test cases for PrometheusMiddleware."""
 
@@ -21,7 +37,7 @@ class TestPrometheusMiddleware:
         """Clear Prometheus metrics before each test."""
         REQUEST_COUNT.clear()
         REQUEST_DURATION.clear()
-        IN_PROGRESS_REQUESTS.set(0)
+        clear_label_cache()
 
     @pytest.fixture
     def middleware(self):
@@ -30,39 +46,29 @@ class TestPrometheusMiddleware:
         return PrometheusMiddleware(mock_app)
 
     @pytest.fixture
-    def mock_request(self):
-        """Create mock request."""
-        request = Mock(spec=Request)
-        request.method = "GET"
-        request.url.path = "/api/v1/convert"
-        request.scope = {"route": Mock(path="/api/v1/convert")}
-        return request
-
-    @pytest.fixture
-    def mock_response(self):
-        """Create mock response."""
-        response = Mock(spec=Response)
-        response.status_code = 200
-        return response
+    def mock_scope(self):
+        """Create request scope with a matched FastAPI route."""
+        return make_scope(route=Mock(path="/api/v1/convert"))
 
     async def test_middleware_initialization(self, middleware):
         """Test middleware initialization."""
         assert isinstance(middleware, PrometheusMiddleware)
         assert hasattr(middleware, "app")
 
-    async def test_dispatch_successful_request(self, middleware, mock_request, mock_response):
+    async def test_successful_request(self, mock_scope):
         """Test successful request processing."""
-        # Mock call_next to return response
-        call_next = AsyncMock(return_value=mock_response)
+        app = make_app(200)
+        middleware = PrometheusMiddleware(app)
+        receive = AsyncMock()
+        send = AsyncMock()
 
         # Execute middleware
-        result = await middleware.dispatch(mock_request, call_next)
+        await middleware(mock_scope, receive, send)
 
-        # Verify response is returned
-        assert result == mock_response
-
-        # Verify call_next was called
-        call_next.assert_called_once_with(mock_request)
+        # Verify downstream app was called and response messages were forwarded
+        app.assert_called_once()
+        assert send.call_count == 2
+        assert send.call_args_list[0][0][0]["status"] == 200
 
         # Verify metrics were recorded (Counter creates both _total and _created samples)
         request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
@@ -78,17 +84,42 @@ class TestPrometheusMiddleware:
         duration_samples = next(iter(REQUEST_DURATION.collect())).samples
         assert len([s for s in duration_samples if s.name.endswith("_count")]) == 1
 
-        # Verify in-progress requests is back to 0
-        assert IN_PROGRESS_REQUESTS._value._value == 0
+    async def test_route_matched_during_request_used_as_endpoint(self):
+        """Test that the route stored in the scope by the router labels the request."""
+
+        async def routed_app(scope, receive, send):
+            scope["route"] = Mock(path="/api/v1/items/{item_id}")
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        middleware = PrometheusMiddleware(AsyncMock(side_effect=routed_app))
+
+        await middleware(make_scope("/api/v1/items/abc"), AsyncMock(), AsyncMock())
+
+        request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
+        total_samples = [s for s in request_count_samples if s.name.endswith("_total")]
+        assert len(total_samples) == 1
+        assert total_samples[0].labels["endpoint"] == "/api/v1/items/{item_id}"
+
+    async def test_error_response_status_recorded(self, mock_scope):
+        """Test that the status from the response start message is recorded."""
+        middleware = PrometheusMiddleware(make_app(404))
+
+        await middleware(mock_scope, AsyncMock(), AsyncMock())
+
+        request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
+        total_samples = [s for s in request_count_samples if s.name.endswith("_total")]
+        assert len(total_samples) == 1
+        assert total_samples[0].labels["status_code"] == "404"
 
-    async def test_dispatch_failed_request(self, middleware, mock_request):
+    async def test_failed_request(self, mock_scope):
         """Test failed request processing."""
-        # Mock call_next to raise exception
-        call_next = AsyncMock(side_effect=Exception("Test error"))
+        # Mock app to raise exception
+        app = AsyncMock(side_effect=Exception("Test error"))
+        middleware = PrometheusMiddleware(app)
 
         # Execute middleware and expect exception
         with pytest.raises(Exception, match="Test error"):
-            await middleware.dispatch(mock_request, call_next)
+            await middleware(mock_scope, AsyncMock(), AsyncMock())
 
         # Verify error metrics were recorded (Counter creates both _total and _created samples)
         request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
@@ -98,56 +129,60 @@ class TestPrometheusMiddleware:
         assert sample.labels["status_code"] == "500"
         assert sample.value == 1.0
 
-        # Verify in-progress requests is decremented even on error
-        assert IN_PROGRESS_REQUESTS._value._value == 0
-
-    async def test_dispatch_skips_metrics_endpoint(self, middleware):
+    async def test_skips_metrics_endpoint(self):
         """Test that /metrics endpoint is skipped."""
-        # Create request for metrics endpoint
-        request = Mock(spec=Request)
-        request.url.path = "/metrics"
-
-        mock_response = Mock(spec=Response)
-        call_next = AsyncMock(return_value=mock_response)
+        app = make_app(200)
+        middleware = PrometheusMiddleware(app)
+        scope = make_scope("/metrics")
+        receive = AsyncMock()
+        send = AsyncMock()
 
         # Execute middleware
-        result = await middleware.dispatch(request, call_next)
+        await middleware(scope, receive, send)
 
-        # Verify response is returned without processing
-        assert result == mock_response
-        call_next.assert_called_once_with(request)
+        # Verify request is passed through untouched
+        app.assert_called_once_with(scope, receive, send)
 
         # Verify no metrics were recorded (no _total samples should be present)
         request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
         total_samples = [s for s in request_count_samples if s.name.endswith("_total")]
         assert len(total_samples) == 0
 
-    async def test_dispatch_tracks_in_progress_requests(
-        self, middleware, mock_request, mock_response
-    ):
-        """Test that in-progress requests are tracked correctly."""
-        initial_value = IN_PROGRESS_REQUESTS._value._value
+    @pytest.mark.parametrize("path", ["/health", "/favicon.ico", "/openapi.json", "/docs"])
+    async def test_skips_probe_and_docs_endpoints(self, path):
+        """Test that health check and documentation endpoints are skipped."""
+        app = make_app(200)
+        middleware = PrometheusMiddleware(app)
+        scope = make_scope(path)
+        receive = AsyncMock()
+        send = AsyncMock()
 
-        # Mock call_next to check in-progress count during execution
-        async def check_in_progress(request):
-            # During request processing, count should be incremented
-            assert IN_PROGRESS_REQUESTS._value._value == initial_value + 1
-            return mock_response
+        await middleware(scope, receive, send)
 
-        call_next = AsyncMock(side_effect=check_in_progress)
+        app.assert_called_once_with(scope, receive, send)
 
-        # Execute middleware
-        await middleware.dispatch(mock_request, call_next)
+        request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
+        total_samples = [s for s in request_count_samples if s.name.endswith("_total")]
+        assert len(total_samples) == 0
+
+    async def test_skips_non_http_scopes(self):
+        """Test that lifespan and websocket scopes are passed through."""
+        app = AsyncMock()
+        middleware = PrometheusMiddleware(app)
+        scope = {"type": "lifespan"}
+        receive = AsyncMock()
+        send = AsyncMock()
 
-        # After completion, count should be back to initial
-        assert IN_PROGRESS_REQUESTS._value._value == initial_value
+        await middleware(scope, receive, send)
 
-    async def test_dispatch_records_duration(self, middleware, mock_request, mock_response):
+        app.assert_called_once_with(scope, receive, send)
+
+    async def test_records_duration(self, mock_scope):
         """Test that request duration is recorded correctly."""
-        call_next = AsyncMock(return_value=mock_response)
+        middleware = PrometheusMiddleware(make_app(200))
 
         # Execute middleware
-        await middleware.dispatch(mock_request, call_next)
+        await middleware(mock_scope, AsyncMock(), AsyncMock())
 
         # Verify duration histogram was updated
         duration_samples = next(iter(REQUEST_DURATION.collect())).samples
@@ -164,45 +199,58 @@ class TestPrometheusMiddleware:
 
     def test_get_endpoint_pattern_with_route(self, middleware):
         """Test endpoint pattern extraction with FastAPI route."""
-        request = Mock(spec=Request)
-        request.scope = {"route": Mock(path="/api/v1/convert")}
-        request.url.path = "/api/v1/convert"
+        scope = make_scope("/api/v1/convert", route=Mock(path="/api/v1/convert"))
 
-        result = middleware._get_endpoint_pattern(request)
+        result = middleware._get_endpoint_pattern(scope)
         assert result == "/api/v1/convert"
 
     def test_get_endpoint_pattern_without_route(self, middleware):
         """Test endpoint pattern extraction without FastAPI route."""
-        request = Mock(spec=Request)
-        request.scope = {}
-        request.url.path = "/api/v1/convert"
+        scope = make_scope("/api/v1/convert")
 
-        result = middleware._get_endpoint_pattern(request)
+        result = middleware._get_endpoint_pattern(scope)
         assert result == "/api/v1/convert"
 
     def test_get_endpoint_pattern_normalizes_uuids(self, middleware):
         """Test that UUID patterns are normalized."""
-        request = Mock(spec=Request)
-        request.scope = {}
-        request.url.path = "/api/v1/conversion/123e4567-e89b-12d3-a456-426614174000"
+        scope = make_scope("/api/v1/conversion/123e4567-e89b-12d3-a456-426614174000")
 
-        result = middleware._get_endpoint_pattern(request)
+        result = middleware._get_endpoint_pattern(scope)
         assert result == "/api/v1/conversion/{uuid}"
 
     def test_get_endpoint_pattern_normalizes_numeric_ids(self, middleware):
         """Test that numeric ID patterns are normalized."""
-        request = Mock(spec=Request)
-        request.scope = {}
-        request.url.path = "/api/v1/user/12345/profile"
+        scope = make_scope("/api/v1/user/12345/profile")
 
-        result = middleware._get_endpoint_pattern(request)
+        result = middleware._get_endpoint_pattern(scope)
         assert result == "/api/v1/user/{id}/profile"
 
     def test_get_endpoint_pattern_multiple_ids(self, middleware):
         """Test normalization with multiple ID patterns."""
-        request = Mock(spec=Request)
-        request.scope = {}
-        request.url.path = "/api/v1/user/123/conversion/456e7890-a12b-34cd-e567-890123456789"
+        scope = make_scope("/api/v1/user/123/conversion/456e7890-a12b-34cd-e567-890123456789")
 
-        result = middleware._get_endpoint_pattern(request)
+        result = middleware._get_endpoint_pattern(scope)
         assert result == "/api/v1/user/{id}/conversion/{uuid}"
+
+    def test_prebind_route_metrics(self):
+        """Test that route metric children are created with zero values at startup."""
+        app = FastAPI()
+
+        @app.get("/api/v1/items")
+        async def items():
+            return []
+
+        prebind_route_metrics(app.routes)
+
+        request_count_samples = next(iter(REQUEST_COUNT.collect())).samples
+        total_samples = [s for s in request_count_samples if s.name.endswith("_total")]
+        labels = {
+            (s.labels["method"], s.labels["endpoint"], s.labels["status_code"])
+            for s in total_samples
+        }
+        assert labels == {("GET", "/api/v1/items", "200"), ("GET", "/api/v1/items", "500")}
+        assert all(s.value == 0.0 for s in total_samples)
+
+        duration_samples = next(iter(REQUEST_DURATION.collect())).samples
+        count_samples = [s for s in duration_samples if s.name.endswith("_count")]
+        assert [s.labels["endpoint"] for s in count_samples] == ["/api/v1/items"]
@@ -4,10 +4,15 @@ import pytest
 
 from currency_app.middleware.metrics import (
     CURRENCY_CONVERSIONS_TOTAL,
+    DATABASE_CONNECTION_ERRORS,
     DATABASE_OPERATIONS_TOTAL,
+    DATABASE_QUERY_DURATION,
     RATES_REQUESTS_TOTAL,
+    clear_label_cache,
     record_currency_conversion,
+    record_database_connection_error,
     record_database_operation,
+    record_database_query_duration,
     record_rates_request,
 )
 
@@ -21,6 +26,9 @@ class TestMetricsUtilities:
         CURRENCY_CONVERSIONS_TOTAL.clear()
         RATES_REQUESTS_TOTAL.clear()
         DATABASE_OPERATIONS_TOTAL.clear()
+        DATABASE_QUERY_DURATION.clear()
+        DATABASE_CONNECTION_ERRORS.clear()
+        clear_label_cache()
 
     def test_record_currency_conversion_success(self):
         """Test recording successful currency conversion."""
@@ -270,6 +278,40 @@ class TestMetricsUtilities:
         )
         assert select_conversions_error.value == 1.0
 
+    def test_record_database_query_duration_known_labels(self):
+        """Test recording query duration with whitelisted labels."""
+        record_database_query_duration("select", "rate_history", 0.01)
+
+        samples = next(iter(DATABASE_QUERY_DURATION.collect())).samples
+        count_samples = [s for s in samples if s.name.endswith("_count")]
+        assert len(count_samples) == 1
+
+        sample = count_samples[0]
+        assert sample.labels["operation"] == "select"
+        assert sample.labels["table"] == "rate_history"
+        assert sample.value == 1.0
+
+    def test_record_database_query_duration_unknown_labels_collapsed(self):
+        """Test that unknown operations and tables are reported as "other"."""
+        record_database_query_duration("vacuum", "dataset_1", 0.01)
+        record_database_query_duration("select", "dataset_2", 0.01)
+
+        samples = next(iter(DATABASE_QUERY_DURATION.collect())).samples
+        count_samples = [s for s in samples if s.name.endswith("_count")]
+        assert len(count_samples) == 2
+
+        labels = {(s.labels["operation"], s.labels["table"]) for s in count_samples}
+        assert labels == {("other", "other"), ("select", "other")}
+
+    def test_record_database_connection_error_unknown_type_collapsed(self):
+        """Test that unknown error types are reported as "other"."""
+        record_database_connection_error("OperationalError")
+        record_database_connection_error("SomeCustomError")
+
+        samples = next(iter(DATABASE_CONNECTION_ERRORS.collect())).samples
+        total_samples = [s for s in samples if s.name.endswith("_total")]
+        assert {s.labels["error_type"] for s in total_samples} == {"OperationalError", "other"}
+
     def test_all_utility_functions_together(self):
         """Test that all utility functions work together without interference."""
         # Record metrics from all utility functions
@@ -97,20 +97,22 @@ class TestRatesHistoryService:
         expected_records = 2 * 4 * 2  # 2 days * 4 snapshots per day * 2 currencies
         assert result == expected_records
 
-        # Should have called add for each record
-        assert mock_db_session.add.call_count == expected_records
+        # Should insert all records in a single batched execute
+        mock_db_session.execute.assert_called_once()
+        mock_db_session.add.assert_not_called()
         mock_db_session.commit.assert_called_once()
+        added_records = mock_db_session.execute.call_args[0][1]
+        assert len(added_records) == expected_records
 
         # Verify USD rates are always 1.0
-        added_records = [call[0][0] for call in mock_db_session.add.call_args_list]
-        usd_records = [r for r in added_records if r.currency == "USD"]
+        usd_records = [r for r in added_records if r["currency"] == "USD"]
         for usd_record in usd_records:
-            assert usd_record.rate == Decimal("1.000000")
+            assert usd_record["rate"] == Decimal("1.000000")
 
         # Verify EUR rates have variation
-        eur_records = [r for r in added_records if r.currency == "EUR"]
+        eur_records = [r for r in added_records if r["currency"] == "EUR"]
         for eur_record in eur_records:
-            assert eur_record.rate != Decimal("0.8500")  # Should be varied
+            assert eur_record["rate"] != Decimal("0.8500")  # Should be varied
 
     def test_get_rates_history_basic(
         self, rates_history_service, mock_db_session, sample_rate_history_records